@@ -11,16 +11,58 @@ import os
 import re
 import subprocess
 import sys
+import tarfile
 import tempfile
 import time
 from io import BytesIO
 
+DIST_PATH_RE = re.compile(r'^pool/(?P<dist>[^/]+)/main')
+
+RELEASE_PATH_RE = re.compile(r'^dists/([^/]*)/Release$')
+
+# According to
+# https://www.debian.org/doc/manuals/debian-reference/ch02.en.html#_debian_package_file_names
+# the package name format is the following
+# <package-name>_<upstream-version>-<debian.revision>_<architecture>.deb
+#
+# Also to usable characters for <upstream-version> '~' has been
+# added, because some packages from the ubuntu repository use it
+# and according to https://www.debian.org/doc/debian-policy/ch-controlfields.html#version
+# it's fine.
+DEB_FILE_RE = re.compile(
+    r'^(?P<package_name>[a-z0-9][-a-z0-9.+]+)_(?P<upstream_version>[-a-zA-Z0-9.+:~]+)'
+    r'(-(?P<debian_revision>[a-zA-Z0-9.+~]+))_(?P<arch>[^\.]+)\.deb$'
+)
+
+# According to https://www.debian.org/doc/debian-policy/ch-controlfields.html#version:
+# " If there is no debian_revision then hyphens are not allowed [in upstream_version].
+#
+# <...>
+#
+# It [debian_revision] is optional; if it isn't present then the upstream_version
+# must not contain a hyphen.
+#
+# The package management system will break the version number apart at the last hyphen
+# in the string (if there is one) to determine the upstream_version and debian_revision.
+# The absence of a debian_revision is equivalent to a debian_revision of 0.
+DEB_FILE_NO_REVISION_RE = re.compile(
+    r'^(?P<package_name>[a-z0-9][-a-z0-9.+]+)_'
+    r'(?P<upstream_version>[a-zA-Z0-9.+:~]+)_'
+    r'(?P<arch>[^\.]+)\.deb$'
+)
+
 
 def file_checksum(file_name, checksum_type):
-    h = hashlib.new(checksum_type)
     with open(file_name, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            h.update(chunk)
+        # hashlib.file_digest() is available since Python 3.11.
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, checksum_type).hexdigest()
+
+        h = hashlib.new(checksum_type)
+        buf = bytearray(1 << 20)
+        view = memoryview(buf)
+        for size in iter(lambda: f.readinto(buf), 0):
+            h.update(view[:size])
 
     return h.hexdigest()
 
@@ -79,6 +121,52 @@ def gpg_sign_string(data, keyname=None, inline=False):
     return stdout
 
 
+# Size of the header of an ar archive member.
+AR_HEADER_SIZE = 60
+
+# Control archives of a .deb package and modes to open them with tarfile.
+CONTROL_TAR_ARCHIVES = {
+    'control.tar.gz': 'r:gz',
+    'control.tar.xz': 'r:xz',
+    'control.tar.zst': None,
+}
+
+
+def read_ar_member(path, names):
+    """Read the first member of the ar archive with one of the names.
+
+    Keyword arguments:
+    path - path to the ar archive (string).
+    names - names of the members to look for (container of strings).
+
+    Return the name and the contents (bytes) of the member or (None, None)
+    if there is no such member.
+    """
+    with open(path, 'rb') as f:
+        if f.read(8) != b'!<arch>\n':
+            return None, None
+
+        while True:
+            header = f.read(AR_HEADER_SIZE)
+            if len(header) < AR_HEADER_SIZE:
+                return None, None
+
+            name = header[:16].decode('ascii').rstrip()
+            size = int(header[48:58])
+            # BSD ar stores long names right before the data.
+            if name.startswith('#1/'):
+                name_size = int(name[3:])
+                name = f.read(name_size).rstrip(b'\0').decode('ascii')
+                size -= name_size
+            name = name.rstrip('/')
+
+            if name in names:
+                return name, f.read(size)
+
+            # The data is aligned to an even offset.
+            f.seek(size + size % 2, os.SEEK_CUR)
+
+
 class IndexUnit(object):
     """Describes the common part of an index unit."""
 
@@ -152,19 +240,25 @@ class Package(IndexUnit):
         self.arch = arch
 
     def parse_deb(self, debfile):
-        if subprocess.call('ar t ' + debfile + ' | grep -q control.tar.gz', shell=True) == 0:
-            cmd = 'ar -p ' + debfile + ' control.tar.gz |' + \
-                  'tar -xzf - --to-stdout ./control'
-        elif subprocess.call('ar t ' + debfile + ' | grep -q control.tar.xz', shell=True) == 0:
-            cmd = 'ar -p ' + debfile + ' control.tar.xz |' + \
-                  'tar -xJf - --to-stdout ./control'
-        elif subprocess.call('ar t ' + debfile + ' | grep -q control.tar.zst', shell=True) == 0:
-            cmd = 'ar -p ' + debfile + ' control.tar.zst |' + \
-                  'tar --use-compress-program=unzstd -xf - --to-stdout ./control'
-        else:
+        # The control archive is small, so it is read into memory and
+        # unpacked with tarfile instead of piping "ar" to "tar".
+        name, data = read_ar_member(debfile, CONTROL_TAR_ARCHIVES)
+        if name is None:
             raise FileNotFoundError('Cannot find control TAR archive')
 
-        control = subprocess.check_output(cmd, shell=True)
+        mode = CONTROL_TAR_ARCHIVES[name]
+        if mode is None:
+            # tarfile doesn't support zstd.
+            try:
+                data = subprocess.run(['unzstd'], input=data, stdout=subprocess.PIPE,
+                                      check=True).stdout
+            except FileNotFoundError:
+                raise RuntimeError("Can't unpack '%s': unzstd is not found" % name)
+            mode = 'r:'
+
+        with tarfile.open(fileobj=BytesIO(data), mode=mode) as tar:
+            control = tar.extractfile('./control').read()
+
         self.parse_string(control.decode('utf-8').strip())
 
     def __hash__(self):
@@ -436,7 +530,7 @@ def get_dist_from_path(path):
     path - path to control file (string).
     """
     dist = ''
-    match_path = re.match('^pool/(?P<dist>[^/]+)/main', path)
+    match_path = DIST_PATH_RE.match(path)
     if match_path:
         dist = match_path.group('dist')
 
@@ -454,37 +548,10 @@ def split_control_file_path(path, ctrl_type):
     arch = ''
 
     if ctrl_type == 'binary':
-        # According to
-        # https://www.debian.org/doc/manuals/debian-reference/ch02.en.html#_debian_package_file_names
-        # the package name format is the following
-        # <package-name>_<upstream-version>-<debian.revision>_<architecture>.deb
-        #
-        # Also to usable characters for <upstream-version> '~' has been
-        # added, because some packages from the ubuntu repository use it
-        # and according to https://www.debian.org/doc/debian-policy/ch-controlfields.html#version
-        # it's fine.
-        expr = r'^(?P<package_name>[a-z0-9][-a-z0-9.+]+)_(?P<upstream_version>[-a-zA-Z0-9.+:~]+)'\
-               r'(-(?P<debian_revision>[a-zA-Z0-9.+~]+))_(?P<arch>[^\.]+)\.deb$'
-
-        match_package = re.match(expr, os.path.basename(path))
+        basename = os.path.basename(path)
+        match_package = DEB_FILE_RE.match(basename)
         if not match_package:
-            # According to https://www.debian.org/doc/debian-policy/ch-controlfields.html#version:
-            # " If there is no debian_revision then hyphens are not allowed [in upstream_version].
-            #
-            # <...>
-            #
-            # It [debian_revision] is optional; if it isn't present then the upstream_version
-            # must not contain a hyphen.
-            #
-            # The package management system will break the version number apart at the last hyphen
-            # in the string (if there is one) to determine the upstream_version and debian_revision.
-            # The absence of a debian_revision is equivalent to a debian_revision of 0.
-            expr2 = (
-                r'^(?P<package_name>[a-z0-9][-a-z0-9.+]+)_'
-                r'(?P<upstream_version>[a-zA-Z0-9.+:~]+)_'
-                r'(?P<arch>[^\.]+)\.deb$'
-            )
-            match_package = re.match(expr2, os.path.basename(path))
+            match_package = DEB_FILE_NO_REVISION_RE.match(basename)
 
         if not match_package:
             return None
@@ -497,7 +564,10 @@ def split_control_file_path(path, ctrl_type):
     if ctrl_type == 'src':
         arch = 'source'
 
-    return (dist, component, arch)
+    # There are only a few distributions and architectures, so the strings
+    # cut from the paths are interned to share them between the results
+    # (literals are interned already).
+    return (sys.intern(dist), component, sys.intern(arch))
 
 
 def save_malformed_list(storage, dist, malformed_list):
@@ -553,9 +623,8 @@ def read_release_and_indices(repo_info):
     Keyword arguments:
     repo_info - information about the processed repository (RepoInfo object).
     """
-    expr = r'^dists/([^/]*)/Release$'
     for file_path in repo_info.storage.files('dists'):
-        match = re.match(expr, file_path)
+        match = RELEASE_PATH_RE.match(file_path)
 
         if not match:
             continue
@@ -638,18 +707,18 @@ def process_index_units(repo_info, tempdir, index_type, force=False):
 
     index_list = None
     ctrl_type = ''
-    expr = ''
+    suffix = ''
     tmp_filename = ''
 
     if index_type == 'packages':
         index_list = repo_info.package_index_list
         ctrl_type = 'binary'
-        expr = r'^.*\.deb$'
+        suffix = '.deb'
         tmp_filename = 'package.deb'
     elif index_type == 'sources':
         index_list = repo_info.source_index_list
         ctrl_type = 'src'
-        expr = r'^.*\.dsc$'
+        suffix = '.dsc'
         tmp_filename = 'source.dsc'
     else:
         raise RuntimeError('Unknown index type: ' + index_type)
@@ -665,8 +734,7 @@ def process_index_units(repo_info, tempdir, index_type, force=False):
     for file_path in repo_info.storage.files('pool'):
         file_path = file_path.lstrip('/')
 
-        match = re.match(expr, file_path)
-        if not match:
+        if not file_path.endswith(suffix):
             continue
 
         components = split_control_file_path(file_path, ctrl_type)
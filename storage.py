@@ -8,6 +8,7 @@ import urllib
 from io import BytesIO
 
 import boto3
+from botocore.exceptions import ClientError
 
 
 class Storage:
@@ -39,6 +40,23 @@ class Storage:
     def files(self, subdir=None):
         raise NotImplementedError()
 
+    def delete_files(self, keys):
+        """Delete several files.
+
+        Storages that can delete files in one request should override it.
+        """
+        for key in keys:
+            self.delete_file(key)
+
+    def files_with_mtime(self, subdir=None):
+        """Yield (key, mtime) pairs of the files.
+
+        Storages that get the modification time along with the listing
+        should override it to avoid a separate mtime() request per file.
+        """
+        for key in self.files(subdir):
+            yield key, self.mtime(key)
+
 
 def _mkdir_recursive(path):
     try:
@@ -78,7 +96,9 @@ class FilesystemStorage(Storage):
     def download_file(self, key, destination):
         fullpath = os.path.join(self.basedir, key)
 
-        shutil.copy(fullpath, destination)
+        # copyfile() copies the data in the kernel with sendfile() on Linux
+        # and falls back to a read/write loop where it isn't supported.
+        shutil.copyfile(fullpath, destination)
 
     def upload_file(self, key, source):
         fullpath = os.path.join(self.basedir, key)
@@ -120,6 +140,14 @@ class FilesystemStorage(Storage):
                 yield os.path.relpath(os.path.join(dirname, filename), self.basedir)
 
 
+# Files smaller than that are uploaded with a single PUT request
+# (it is the multipart threshold of boto3 transfers by default).
+S3_SINGLE_PUT_LIMIT = 8 * 1024 * 1024
+
+# Maximum number of keys in one DeleteObjects request.
+S3_DELETE_LIMIT = 1000
+
+
 class S3Storage(Storage):
 
     def __init__(self,
@@ -157,18 +185,24 @@ class S3Storage(Storage):
     def write_file(self, key, data):
         fullkey = os.path.normpath(os.path.join(self.prefix, key.lstrip('/')))
 
-        s3obj = self.resource.Object(self.bucket, fullkey)
-
-        buf = BytesIO()
-        buf.write(data)
-        buf.seek(0)
-
         # Set the arguments of the uploaded file according
         # to the "S3Storage" settings.
         extra_args = {}
         if self.public_read:
             extra_args['ACL'] = 'public-read'
 
+        # Small files (e.g. metafiles) don't need the transfer manager.
+        if len(data) < S3_SINGLE_PUT_LIMIT:
+            self.client.put_object(Bucket=self.bucket, Key=fullkey, Body=data,
+                                   **extra_args)
+            return
+
+        s3obj = self.resource.Object(self.bucket, fullkey)
+
+        buf = BytesIO()
+        buf.write(data)
+        buf.seek(0)
+
         s3obj.upload_fileobj(buf, ExtraArgs=extra_args)
 
     def download_file(self, key, destination):
@@ -193,6 +227,21 @@ class S3Storage(Storage):
 
         self.client.delete_object(Bucket=self.bucket, Key=fullkey)
 
+    def delete_files(self, keys):
+        fullkeys = [os.path.normpath(os.path.join(self.prefix, key.lstrip('/')))
+                    for key in keys]
+
+        for i in range(0, len(fullkeys), S3_DELETE_LIMIT):
+            objects = [{'Key': fullkey} for fullkey in fullkeys[i:i + S3_DELETE_LIMIT]]
+            response = self.client.delete_objects(
+                Bucket=self.bucket, Delete={'Objects': objects, 'Quiet': True})
+
+            errors = response.get('Errors')
+            if errors:
+                raise RuntimeError("Can't delete files: %s" %
+                                   ', '.join('%s (%s)' % (error.get('Key'), error.get('Message'))
+                                             for error in errors))
+
     def mtime(self, key):
         fullkey = os.path.normpath(os.path.join(self.prefix, key.lstrip('/')))
 
@@ -205,13 +254,20 @@ class S3Storage(Storage):
         fullkey = os.path.normpath(
             os.path.join(self.prefix, key.lstrip('/')))
 
-        bucket = self.resource.Bucket(self.bucket)
-
-        objs = list(bucket.objects.filter(Prefix=fullkey))
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=fullkey)
+        except ClientError as exc:
+            if exc.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return False
+            raise
 
-        return len(objs) > 0 and objs[0].key == fullkey
+        return True
 
     def files(self, subdir=None):
+        for key, _ in self.files_with_mtime(subdir):
+            yield key
+
+    def files_with_mtime(self, subdir=None):
         dirname = self.prefix
 
         if subdir is not None:
@@ -227,7 +283,11 @@ class S3Storage(Storage):
             if result.get('Contents') is not None:
                 for fileobj in result.get('Contents'):
                     filepath = os.path.relpath(fileobj.get('Key'), dirname)
-                    yield os.path.normpath(os.path.join(subdir or '/', filepath))
+                    # The listing already contains the modification time,
+                    # so it is converted the same way as in mtime().
+                    mtime = fileobj.get('LastModified')
+                    yield (os.path.normpath(os.path.join(subdir or '/', filepath)),
+                           time.mktime(mtime.timetuple()))
 
 
 class HttpStorage(Storage):
@@ -1,5 +1,5 @@
+import bisect
 import time
-from io import BytesIO
 
 from storage import Storage
 
@@ -11,45 +11,52 @@ class DummyStorage(Storage):
     def __init__(self):
         super(Storage, self).__init__()
         self.fs = {}
+        # Sorted keys of "fs" for listing files by prefix.
+        self.keys = []
+
+    def _add_file(self, key, data):
+        if key not in self.fs:
+            bisect.insort(self.keys, key)
+        self.fs[key] = {'data': data, 'mtime': time.time()}
 
     def read_file(self, key):
-        file = self.fs.get(key, None)
-        if file is None:
+        if key not in self.fs:
             raise FileNotFoundError(2, 'No such file or directory:', key)
-        return file['data'].getvalue()
+        return self.fs[key]['data']
 
     def write_file(self, key, data):
-        buf = BytesIO()
-        buf.write(data)
-        buf.seek(0)
-        self.fs[key] = {'data': buf, 'mtime': time.time()}
+        # The data is copied only if it is mutable (e.g. bytearray).
+        self._add_file(key, bytes(data))
 
     def download_file(self, key, destination):
-        if self.fs.get(key) is None:
+        if key not in self.fs:
             raise FileNotFoundError(2, 'No such file or directory:', key)
-        source = self.fs[key]['data']
-        dest = BytesIO()
-        dest.write(source.getbuffer())
-        self.fs[destination] = {'data': dest, 'mtime': time.time()}
+        self._add_file(destination, self.fs[key]['data'])
 
     def upload_file(self, key, source):
-        if self.fs.get(source) is None:
+        if source not in self.fs:
             raise FileNotFoundError(2, 'No such file or directory:', source)
-        source = self.fs[source]['data']
-        dest = BytesIO()
-        dest.write(source.getbuffer())
-        self.fs[key] = {'data': dest, 'mtime': time.time()}
+        self._add_file(key, self.fs[source]['data'])
 
     def delete_file(self, key):
         del self.fs[key]
+        del self.keys[bisect.bisect_left(self.keys, key)]
 
     def mtime(self, key):
         return self.fs[key]['mtime']
 
     def exists(self, key):
-        return bool(self.fs.get(key))
+        return key in self.fs
 
     def files(self, subdir=''):
-        for key in self.fs:
-            if key.startswith(subdir):
-                yield key
+        subdir = subdir or ''
+        if not subdir:
+            yield from list(self.keys)
+            return
+
+        # Keys with the prefix are between the prefix itself and the
+        # prefix with the last character incremented.
+        upper = subdir[:-1] + chr(ord(subdir[-1]) + 1)
+        start = bisect.bisect_left(self.keys, subdir)
+        end = bisect.bisect_left(self.keys, upper, start)
+        yield from self.keys[start:end]
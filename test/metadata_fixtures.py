@@ -0,0 +1,26 @@
+def other_data_many(count):
+    """Provide other data for the given number of packages."""
+
+    other_data = {}
+    for i in range(count):
+        name = 'Test Package Scale %d' % i
+        ver = '1.%d.0' % i
+        other_data[(name, 1, '10.el8_4', ver)] = {
+            'pkgid': '%064x' % i,
+            'name': name,
+            'arch': 'x86_64',
+            'version': {
+                'ver': ver,
+                'rel': '10.el8_4',
+                'epoch': 1
+            },
+            'changelog': [
+                {
+                    'author': 'User%d <user%d@mail.ru> - 1:%s-10' % (i, i, ver),
+                    'date': 1626091200 + i,
+                    'text': '- text line scale %d' % i
+                },
+            ]
+        }
+
+    return other_data
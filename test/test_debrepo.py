@@ -8,6 +8,64 @@ import debrepo
 
 TEST_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Expected fields of the packages with different control archives.
+CONTROL_TAR_PACKAGES = {
+    # control.tar.xz
+    'openssl_1.1.1f-1ubuntu2_amd64.deb': {
+        'Package': 'openssl',
+        'Version': '1.1.1f-1ubuntu2',
+        'Architecture': 'amd64',
+        'Maintainer': 'Ubuntu Developers <ubuntu-devel-discuss@lists.ubuntu.com>',
+        'Installed-Size': '1257',
+        'Depends': 'libc6 (>= 2.15), libssl1.1 (>= 1.1.1)',
+        'Suggests': 'ca-certificates',
+        'Section': 'utils',
+        'Priority': 'optional',
+        'Multi-Arch': 'foreign',
+        'Homepage': 'https://www.openssl.org/',
+        'Description': "Secure Sockets Layer toolkit - cryptographic utility\n "
+                       "This package is part of the OpenSSL project's implementation "
+                       "of the SSL\n and TLS cryptographic protocols for secure "
+                       "communication over the\n Internet.\n .\n It contains the "
+                       "general-purpose command line binary /usr/bin/openssl,\n useful"
+                       " for cryptographic operations such as:\n  * creating RSA, DH, "
+                       "and DSA key parameters;\n  * creating X.509 certificates, "
+                       "CSRs, and CRLs;\n  * calculating message digests;\n  * "
+                       "encrypting and decrypting with ciphers;\n  * testing SSL/TLS "
+                       "clients and servers;\n  * handling S/MIME signed or encrypted "
+                       "mail.",
+        'Original-Maintainer': 'Debian OpenSSL Team '
+                               '<pkg-openssl-devel@lists.alioth.debian.org>'
+    },
+    # control.tar.zst
+    'openssl_1.1.1l-1ubuntu1_amd64.deb': {
+        'Package': 'openssl',
+        'Version': '1.1.1l-1ubuntu1',
+        'Architecture': 'amd64',
+        'Maintainer': 'Ubuntu Developers <ubuntu-devel-discuss@lists.ubuntu.com>',
+        'Installed-Size': '1268',
+        'Depends': 'libc6 (>= 2.34), libssl1.1 (>= 1.1.1)',
+        'Suggests': 'ca-certificates',
+        'Section': 'utils',
+        'Priority': 'optional',
+        'Multi-Arch': 'foreign',
+        'Homepage': 'https://www.openssl.org/',
+        'Description': "Secure Sockets Layer toolkit - cryptographic utility\n "
+                       "This package is part of the OpenSSL project's implementation "
+                       "of the SSL\n and TLS cryptographic protocols for secure "
+                       "communication over the\n Internet.\n .\n It contains the "
+                       "general-purpose command line binary /usr/bin/openssl,\n useful"
+                       " for cryptographic operations such as:\n  * creating RSA, DH, "
+                       "and DSA key parameters;\n  * creating X.509 certificates, "
+                       "CSRs, and CRLs;\n  * calculating message digests;\n  * "
+                       "encrypting and decrypting with ciphers;\n  * testing SSL/TLS "
+                       "clients and servers;\n  * handling S/MIME signed or encrypted "
+                       "mail.",
+        'Original-Maintainer': 'Debian OpenSSL Team '
+                               '<pkg-openssl-devel@lists.alioth.debian.org>'
+    }
+}
+
 
 class TestVersionParsing(unittest.TestCase):
     def test_versions(self):
@@ -54,82 +112,35 @@ class TestVersionParsing(unittest.TestCase):
         ]
 
         for test_file_name in test_file_names:
-            test_path = os.path.join(TEST_DIR, f"resources/{test_file_name}")
-            with open(test_path, 'r') as test_file:
-                for package_name in test_file:
-                    self.assertIsNotNone(debrepo.split_control_file_path(package_name, 'binary'),
-                                         "Can't parse packagename: %s" % package_name)
+            with self.subTest(test_file_name=test_file_name):
+                test_path = os.path.join(TEST_DIR, f"resources/{test_file_name}")
+                with open(test_path, 'r') as test_file:
+                    package_names = test_file.read().splitlines()
+
+                # Collect all the names that can't be parsed to report them at once.
+                unparsed = [package_name for package_name in package_names
+                            if debrepo.split_control_file_path(package_name, 'binary') is None]
+                self.assertEqual(unparsed, [], "Can't parse packagenames")
 
 
 class TestIndexUnit(unittest.TestCase):
     def test_control_tar_archive(self):
-        packages = {
-            # control.tar.xz
-            'openssl_1.1.1f-1ubuntu2_amd64.deb': OrderedDict(
-                [
-                    ('Package', 'openssl'),
-                    ('Version', '1.1.1f-1ubuntu2'),
-                    ('Architecture', 'amd64'),
-                    ('Maintainer', 'Ubuntu Developers <ubuntu-devel-discuss@lists.ubuntu.com>'),
-                    ('Installed-Size', '1257'),
-                    ('Depends', 'libc6 (>= 2.15), libssl1.1 (>= 1.1.1)'),
-                    ('Suggests', 'ca-certificates'),
-                    ('Section', 'utils'),
-                    ('Priority', 'optional'),
-                    ('Multi-Arch', 'foreign'),
-                    ('Homepage', 'https://www.openssl.org/'),
-                    ('Description', "Secure Sockets Layer toolkit - cryptographic utility\n "
-                                    "This package is part of the OpenSSL project's implementation "
-                                    "of the SSL\n and TLS cryptographic protocols for secure "
-                                    "communication over the\n Internet.\n .\n It contains the "
-                                    "general-purpose command line binary /usr/bin/openssl,\n useful"
-                                    " for cryptographic operations such as:\n  * creating RSA, DH, "
-                                    "and DSA key parameters;\n  * creating X.509 certificates, "
-                                    "CSRs, and CRLs;\n  * calculating message digests;\n  * "
-                                    "encrypting and decrypting with ciphers;\n  * testing SSL/TLS "
-                                    "clients and servers;\n  * handling S/MIME signed or encrypted "
-                                    "mail."),
-                    ('Original-Maintainer', 'Debian OpenSSL Team '
-                                            '<pkg-openssl-devel@lists.alioth.debian.org>')
-                ]
-            ),
-            # control.tar.zst
-            'openssl_1.1.1l-1ubuntu1_amd64.deb': OrderedDict(
-                [
-                    ('Package', 'openssl'),
-                    ('Version', '1.1.1l-1ubuntu1'),
-                    ('Architecture', 'amd64'),
-                    ('Maintainer', 'Ubuntu Developers <ubuntu-devel-discuss@lists.ubuntu.com>'),
-                    ('Installed-Size', '1268'),
-                    ('Depends', 'libc6 (>= 2.34), libssl1.1 (>= 1.1.1)'),
-                    ('Suggests', 'ca-certificates'),
-                    ('Section', 'utils'),
-                    ('Priority', 'optional'),
-                    ('Multi-Arch', 'foreign'),
-                    ('Homepage', 'https://www.openssl.org/'),
-                    ('Description', "Secure Sockets Layer toolkit - cryptographic utility\n "
-                                    "This package is part of the OpenSSL project's implementation "
-                                    "of the SSL\n and TLS cryptographic protocols for secure "
-                                    "communication over the\n Internet.\n .\n It contains the "
-                                    "general-purpose command line binary /usr/bin/openssl,\n useful"
-                                    " for cryptographic operations such as:\n  * creating RSA, DH, "
-                                    "and DSA key parameters;\n  * creating X.509 certificates, "
-                                    "CSRs, and CRLs;\n  * calculating message digests;\n  * "
-                                    "encrypting and decrypting with ciphers;\n  * testing SSL/TLS "
-                                    "clients and servers;\n  * handling S/MIME signed or encrypted "
-                                    "mail."),
-                    ('Original-Maintainer', 'Debian OpenSSL Team '
-                                            '<pkg-openssl-devel@lists.alioth.debian.org>')
-                ]
-            )
-        }
-        package = debrepo.Package()
-        for package_name in packages:
-            try:
-                package.parse_deb(os.path.join(TEST_DIR, f"resources/{package_name}"))
-            except FileNotFoundError:
-                self.fail('parse_deb() raised FileNotFoundError unexpectedly!')
-            self.assertEqual(package.fields, packages[package_name])
+        for package_name, fields in CONTROL_TAR_PACKAGES.items():
+            with self.subTest(package_name=package_name):
+                package = debrepo.Package()
+                try:
+                    package.parse_deb(os.path.join(TEST_DIR, f"resources/{package_name}"))
+                except FileNotFoundError:
+                    self.fail('parse_deb() raised FileNotFoundError unexpectedly!')
+                # Compare as lists to check the order of the fields too.
+                self.assertEqual(list(package.fields.items()), list(fields.items()))
+
+    def test_parse_string_replaces_fields(self):
+        """Check that a parsed unit doesn't keep fields of the previous parse."""
+        unit = debrepo.IndexUnit()
+        unit.parse_string('Package: foo\nVersion: 1.0\nDepends: bar')
+        unit.parse_string('Package: baz\nVersion: 2.0')
+        self.assertEqual(list(unit.fields.items()), [('Package', 'baz'), ('Version', '2.0')])
 
     def test_raise_exc_when_unknown_control_tar_archive(self):
         package = debrepo.Package()
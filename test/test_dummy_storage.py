@@ -35,8 +35,13 @@ class TestDummyStorage(unittest.TestCase):
 
         download_file_2 = 'download/download_file_2.txt'
         storage.download_file(download_file, download_file_2)
-        download_files = []
-        for file in storage.files('download'):
-            download_files.append(file)
-        self.assertTrue(download_file in download_files, 'Check of "files" failed.')
-        self.assertTrue(download_file_2 in download_files, 'Check of "files" failed.')
+        download_files = set(storage.files('download'))
+        self.assertIn(download_file, download_files, 'Check of "files" failed.')
+        self.assertIn(download_file_2, download_files, 'Check of "files" failed.')
+
+        download_files_with_mtime = dict(storage.files_with_mtime('download'))
+        self.assertEqual(download_files, set(download_files_with_mtime),
+                         'Check of "files_with_mtime" failed.')
+        self.assertEqual(storage.mtime(download_file),
+                         download_files_with_mtime[download_file],
+                         'Check of "files_with_mtime" failed.')
@@ -1,4 +1,9 @@
+import os
 import unittest
+import xml.etree.ElementTree as ET
+
+from metadata_fixtures import other_data_many
+from xml_helpers import canonical_xml
 
 from rpmrepo import dump_other
 from rpmrepo import header_to_other
@@ -7,18 +12,17 @@ from rpmrepo import header_to_other
 def expected_dump_simple():
     """Provide expected dump for one package."""
 
-    expected_dump = ''
-    expected_dump += '<?xml version="1.0" encoding="UTF-8"?>\n'
-    expected_dump += '<otherdata xmlns="http://linux.duke.edu/metadata/other" packages="1">\n'
-    expected_dump += '<package pkgid="9a791d16574dc3408f495eb383b6c2669b34fc4545b3c43c8c791fbbe10619d2" '  # NOQA
-    expected_dump += 'name="Test Package Dump Other 1" arch="aarch64">\n'
-    expected_dump += '  <version epoch="1" ver="1.30.0" rel="10.el8_4"/>\n'
-    expected_dump += '  <changelog author="User1 &lt;user1@mail.ru&gt; - 1:1.30.0-10" '
-    expected_dump += 'date="1626091200">- text line dump other 1</changelog>\n'
-    expected_dump += '</package>\n'
-    expected_dump += '</otherdata>'
-
-    return expected_dump
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<otherdata xmlns="http://linux.duke.edu/metadata/other" packages="1">\n'
+        '<package pkgid="9a791d16574dc3408f495eb383b6c2669b34fc4545b3c43c8c791fbbe10619d2" '  # NOQA
+        'name="Test Package Dump Other 1" arch="aarch64">\n'
+        '  <version epoch="1" ver="1.30.0" rel="10.el8_4"/>\n'
+        '  <changelog author="User1 &lt;user1@mail.ru&gt; - 1:1.30.0-10" '
+        'date="1626091200">- text line dump other 1</changelog>\n'
+        '</package>\n'
+        '</otherdata>'
+    )
 
 
 def other_data_simple():
@@ -50,30 +54,29 @@ def other_data_simple():
 def expected_dump_complex():
     """Provide expected dump for several packages."""
 
-    expected_dump = ''
-    expected_dump += '<?xml version="1.0" encoding="UTF-8"?>\n'
-    expected_dump += '<otherdata xmlns="http://linux.duke.edu/metadata/other" packages="3">\n'
-    expected_dump += '<package pkgid="9a791d16574dc3408f495eb383b6c2669b34fc4545b3c43c8c791fbbe10619d2" '  # NOQA
-    expected_dump += 'name="Test Many Packages 1" arch="aarch64">\n'
-    expected_dump += '  <version epoch="1" ver="1.30.0" rel="10.el8_4"/>\n'
-    expected_dump += '  <changelog author="User1 &lt;user1@mail.ru&gt; - 1:1.30.0-10" '
-    expected_dump += 'date="1626091200">- text line many packages 1</changelog>\n'
-    expected_dump += '</package>\n'
-    expected_dump += '<package pkgid="9a791d16574dc3408f495eb383b6c2669b34fc4545b3c43c8c791fbbe10619d1" '  # NOQA
-    expected_dump += 'name="Test Many Packages 2" arch="aarch64">\n'
-    expected_dump += '  <version epoch="1" ver="1.29.0" rel="10.el8_4"/>\n'
-    expected_dump += '  <changelog author="User2 &lt;user2@mail.ru&gt; - 1:1.29.0-10" '
-    expected_dump += 'date="1626091180">- text line many packages 2</changelog>\n'
-    expected_dump += '</package>\n'
-    expected_dump += '<package pkgid="9a791d16574dc3408f495eb383b6c2669b34fc4545b3c43c8c791fbbe10619d0" '  # NOQA
-    expected_dump += 'name="Test Many Packages 3" arch="aarch64">\n'
-    expected_dump += '  <version epoch="1" ver="1.28.0" rel="10.el8_4"/>\n'
-    expected_dump += '  <changelog author="User3 &lt;user3@mail.ru&gt; - 1:1.28.0-10" '
-    expected_dump += 'date="1626091120">- text line many packages 3</changelog>\n'
-    expected_dump += '</package>\n'
-    expected_dump += '</otherdata>'
-
-    return expected_dump
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<otherdata xmlns="http://linux.duke.edu/metadata/other" packages="3">\n'
+        '<package pkgid="9a791d16574dc3408f495eb383b6c2669b34fc4545b3c43c8c791fbbe10619d2" '  # NOQA
+        'name="Test Many Packages 1" arch="aarch64">\n'
+        '  <version epoch="1" ver="1.30.0" rel="10.el8_4"/>\n'
+        '  <changelog author="User1 &lt;user1@mail.ru&gt; - 1:1.30.0-10" '
+        'date="1626091200">- text line many packages 1</changelog>\n'
+        '</package>\n'
+        '<package pkgid="9a791d16574dc3408f495eb383b6c2669b34fc4545b3c43c8c791fbbe10619d1" '  # NOQA
+        'name="Test Many Packages 2" arch="aarch64">\n'
+        '  <version epoch="1" ver="1.29.0" rel="10.el8_4"/>\n'
+        '  <changelog author="User2 &lt;user2@mail.ru&gt; - 1:1.29.0-10" '
+        'date="1626091180">- text line many packages 2</changelog>\n'
+        '</package>\n'
+        '<package pkgid="9a791d16574dc3408f495eb383b6c2669b34fc4545b3c43c8c791fbbe10619d0" '  # NOQA
+        'name="Test Many Packages 3" arch="aarch64">\n'
+        '  <version epoch="1" ver="1.28.0" rel="10.el8_4"/>\n'
+        '  <changelog author="User3 &lt;user3@mail.ru&gt; - 1:1.28.0-10" '
+        'date="1626091120">- text line many packages 3</changelog>\n'
+        '</package>\n'
+        '</otherdata>'
+    )
 
 
 def other_data_complex():
@@ -195,7 +198,28 @@ class TestOtherGeneration(unittest.TestCase):
 
         for name, (other_data, expected_dump) in self.dump_packages.items():
             with self.subTest(name=name):
-                self.assertEqual(dump_other(other_data), expected_dump, name)
+                self.assertEqual(canonical_xml(dump_other(other_data)),
+                                 canonical_xml(expected_dump), name)
+
+    def test_dump_other_formatting(self):
+        """Check the exact output of dump_other, including formatting."""
+
+        self.assertEqual(dump_other(other_data_simple()), expected_dump_simple())
+
+    def test_dump_other_scale(self):
+        """Check dump_other on many packages.
+
+        The number of packages can be increased with the MKREPO_BENCH_N
+        environment variable to profile the generation on large repositories.
+        """
+
+        count = int(os.environ.get('MKREPO_BENCH_N', '16'))
+        dump = dump_other(other_data_many(count))
+
+        self.assertIn('packages="%d"' % count, dump)
+        self.assertEqual(dump.count('<package '), count)
+        self.assertEqual(dump.count('<changelog '), count)
+        self.assertEqual(len(ET.fromstring(dump)), count)
 
 
 if __name__ == '__main__':
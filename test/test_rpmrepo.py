@@ -1,62 +1,70 @@
+import hashlib
+import tempfile
 import unittest
 
 from dummy_storage import DummyStorage
+from metadata_fixtures import other_data_many
+from xml_helpers import canonical_xml
 
 import rpmrepo
 
 
 class TestRPMRepo(unittest.TestCase):
+    # repomd.xml that refers to the metafiles missing in the storage.
+    repomd_full = (
+        b'<?xml version="1.0" encoding="UTF-8"?>\n'
+        b'<repomd xmlns="http://linux.duke.edu/metadata/repo" '
+        b'xmlns:rpm="http://linux.duke.edu/metadata/rpm">\n'
+        b'  <revision>1</revision>\n'
+        b'  <data type="filelists">\n'
+        b'    <checksum type="sha256">'
+        b'7aaefa796605c6c6e0ca699ef5a3b1120207d291e47341dcae3fde824b368719'
+        b'</checksum>\n'
+        b'    <open-checksum type="sha256">'
+        b'74fed1d15e4bfe14aa354d8f91ea339bebc5e4a6bf748087807ef22a68e08d2c'
+        b'</open-checksum>\n'
+        b'    <location href="repodata/filelists.xml.gz"/>\n'
+        b'    <timestamp>1633360840</timestamp>\n'
+        b'    <size>341</size>\n'
+        b'    <open-size>832</open-size>\n'
+        b'  </data>\n'
+        b'  <data type="primary">\n'
+        b'    <checksum type="sha256">'
+        b'ab110cb17fefe3d6db446c5707c725c18ae086dd55ca82ea160912f821f58715'
+        b'</checksum>\n'
+        b'    <open-checksum type="sha256">'
+        b'b2387880960bca7f74937484dab6eff71d24090cff61739a88a01b5037fac4a8'
+        b'</open-checksum>\n'
+        b'    <location href="repodata/primary.xml.gz"/>\n'
+        b'    <timestamp>1633360840</timestamp>\n'
+        b'    <size>641</size>\n'
+        b'    <open-size>1387</open-size>\n'
+        b'  </data>\n'
+        b'</repomd>\n'
+    )
+
+    # repomd.xml without information about the metafiles.
+    repomd_empty = (
+        b'<?xml version="1.0" encoding="UTF-8"?>\n'
+        b'<repomd xmlns="http://linux.duke.edu/metadata/repo" '
+        b'xmlns:rpm="http://linux.duke.edu/metadata/rpm">\n'
+        b'  <revision>1</revision>\n'
+        b'</repomd>\n'
+    )
+
     def test_work_with_missing_metafiles(self):
         """The test checks the case when one (or more) files specified in "repomd"
         are absent.
         """
-        repomd_data = ''
-        repomd_data += '<?xml version="1.0" encoding="UTF-8"?>\n'
-        repomd_data += ('<repomd xmlns="http://linux.duke.edu/metadata/repo" '
-                        'xmlns:rpm="http://linux.duke.edu/metadata/rpm">\n')
-        repomd_data += '  <revision>1</revision>\n'
-        repomd_data += '  <data type="filelists">\n'
-        repomd_data += (
-            '    <checksum type="sha256">'
-            '7aaefa796605c6c6e0ca699ef5a3b1120207d291e47341dcae3fde824b368719'
-            '</checksum>\n'
-        )
-        repomd_data += (
-            '    <open-checksum type="sha256">'
-            '74fed1d15e4bfe14aa354d8f91ea339bebc5e4a6bf748087807ef22a68e08d2c'
-            '</open-checksum>\n'
-        )
-        repomd_data += '    <location href="repodata/filelists.xml.gz"/>\n'
-        repomd_data += '    <timestamp>1633360840</timestamp>\n'
-        repomd_data += '    <size>341</size>\n'
-        repomd_data += '    <open-size>832</open-size>\n'
-        repomd_data += '  </data>\n'
-        repomd_data += '  <data type="primary">\n'
-        repomd_data += (
-            '    <checksum type="sha256">'
-            'ab110cb17fefe3d6db446c5707c725c18ae086dd55ca82ea160912f821f58715'
-            '</checksum>\n'
-        )
-        repomd_data += (
-            '    <open-checksum type="sha256">'
-            'b2387880960bca7f74937484dab6eff71d24090cff61739a88a01b5037fac4a8'
-            '</open-checksum>\n'
-        )
-        repomd_data += '    <location href="repodata/primary.xml.gz"/>\n'
-        repomd_data += '    <timestamp>1633360840</timestamp>\n'
-        repomd_data += '    <size>641</size>\n'
-        repomd_data += '    <open-size>1387</open-size>\n'
-        repomd_data += '  </data>\n'
-        repomd_data += '</repomd>\n'
-
         storage = DummyStorage()
-        storage.write_file('repodata/repomd.xml', repomd_data.encode('utf-8'))
+        storage.write_file('repodata/repomd.xml', self.repomd_full)
 
         (filelists, primary, others, revision,
          initial_filelists, initial_primary, initial_others) = rpmrepo.parse_metafiles(storage)
         self.assertEqual(filelists, {})
         self.assertEqual(primary, {})
         self.assertEqual(others, {})
+        self.assertEqual(revision, '1')
         self.assertIsNone(initial_filelists)
         self.assertIsNone(initial_primary)
         self.assertIsNone(initial_others)
@@ -65,25 +73,57 @@ class TestRPMRepo(unittest.TestCase):
         """The test checks the case when in "repomd" information about some metafiles
         are absent.
         """
-        repomd_data = ''
-        repomd_data += '<?xml version="1.0" encoding="UTF-8"?>\n'
-        repomd_data += ('<repomd xmlns="http://linux.duke.edu/metadata/repo" '
-                        'xmlns:rpm="http://linux.duke.edu/metadata/rpm">\n')
-        repomd_data += '  <revision>1</revision>\n'
-        repomd_data += '</repomd>\n'
-
         storage = DummyStorage()
-        storage.write_file('repodata/repomd.xml', repomd_data.encode('utf-8'))
+        storage.write_file('repodata/repomd.xml', self.repomd_empty)
 
         (filelists, primary, others, revision,
          initial_filelists, initial_primary, initial_others) = rpmrepo.parse_metafiles(storage)
         self.assertEqual(filelists, {})
         self.assertEqual(primary, {})
         self.assertEqual(others, {})
+        self.assertEqual(revision, '1')
         self.assertIsNone(initial_filelists)
         self.assertIsNone(initial_primary)
         self.assertIsNone(initial_others)
 
+    def test_non_integer_revision(self):
+        """The test checks that a revision that can't be incremented is
+        replaced with 0 instead of breaking the update.
+        """
+        for revision_element in [b'<revision>release-42</revision>', b'<revision/>']:
+            with self.subTest(revision_element=revision_element):
+                repomd = self.repomd_empty.replace(b'<revision>1</revision>', revision_element)
+                revision = rpmrepo.parse_repomd(repomd)[3]
+                self.assertEqual(revision, '0')
+
+    def test_external_entities_are_not_expanded(self):
+        """The test checks that metadata from the storage can't pull local
+        files into the parsed data with external entities.
+        """
+        secret = 'secret contents of a local file'
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as secret_file:
+            secret_file.write(secret)
+            secret_file.flush()
+
+            other_xml = (
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<!DOCTYPE otherdata [<!ENTITY x SYSTEM "file://%s">]>\n'
+                '<otherdata xmlns="http://linux.duke.edu/metadata/other" packages="1">\n'
+                '<package pkgid="1" name="foo" arch="x86_64">\n'
+                '  <version epoch="0" ver="1.0" rel="1"/>\n'
+                '  <changelog author="foo" date="1">&x;</changelog>\n'
+                '</package>\n'
+                '</otherdata>\n' % secret_file.name
+            ).encode('utf-8')
+
+            try:
+                other = rpmrepo.parse_other(other_xml)
+            except rpmrepo.ET.ParseError:
+                # ElementTree refuses to parse the undefined entity at all.
+                return
+
+        self.assertNotIn(secret, repr(other))
+
     def test_dump_primary(self):
         primary = {
             ('tarantool-lrexlib-pcre', '0', '1.el7.centos', '2.9.0.5'): {
@@ -110,47 +150,48 @@ class TestRPMRepo(unittest.TestCase):
                     'header_start': 280,
                     'header_end': 6104,
                     'provides': {
-                        ('tarantool-lrexlib-pcre', '0', None, '2.9.0.5'): {
-                            'name': 'tarantool-lrexlib-pcre', 'epoch': '0', 'rel': None,
-                            'ver': '2.9.0.5', 'flags': 'EQ'},
-                        ('tarantool-lrexlib-pcre', '0', '1.el7.centos', '2.9.0.5'): {
-                            'name': 'tarantool-lrexlib-pcre', 'epoch': '0', 'rel': '1.el7.centos',
-                            'ver': '2.9.0.5', 'flags': 'EQ'},
-                        ('tarantool-lrexlib-pcre(x86-64)', '0', '1.el7.centos', '2.9.0.5'): {
-                            'name': 'tarantool-lrexlib-pcre(x86-64)', 'epoch': '0',
-                            'rel': '1.el7.centos', 'ver': '2.9.0.5', 'flags': 'EQ'}
+                        ('tarantool-lrexlib-pcre', '0', None, '2.9.0.5'): rpmrepo.Dep(
+                            name='tarantool-lrexlib-pcre', epoch='0', rel=None,
+                            ver='2.9.0.5', flags='EQ'),
+                        ('tarantool-lrexlib-pcre', '0', '1.el7.centos', '2.9.0.5'): rpmrepo.Dep(
+                            name='tarantool-lrexlib-pcre', epoch='0', rel='1.el7.centos',
+                            ver='2.9.0.5', flags='EQ'),
+                        ('tarantool-lrexlib-pcre(x86-64)', '0', '1.el7.centos',
+                         '2.9.0.5'): rpmrepo.Dep(
+                            name='tarantool-lrexlib-pcre(x86-64)', epoch='0',
+                            rel='1.el7.centos', ver='2.9.0.5', flags='EQ')
                     },
                     'requires': {
-                        ('libc.so.6()(64bit)', None, None, None): {
-                            'name': 'libc.so.6()(64bit)', 'epoch': None,
-                            'rel': None, 'ver': None, 'flags': None, 'pre': None},
-                        ('libc.so.6(GLIBC_2.14)(64bit)', None, None, None): {
-                            'name': 'libc.so.6(GLIBC_2.14)(64bit)', 'epoch': None,
-                            'rel': None, 'ver': None, 'flags': None, 'pre': None},
-                        ('libc.so.6(GLIBC_2.2.5)(64bit)', None, None, None): {
-                            'name': 'libc.so.6(GLIBC_2.2.5)(64bit)', 'epoch': None,
-                            'rel': None, 'ver': None, 'flags': None, 'pre': None},
-                        ('libc.so.6(GLIBC_2.3)(64bit)', None, None, None): {
-                            'name': 'libc.so.6(GLIBC_2.3)(64bit)', 'epoch': None,
-                            'rel': None, 'ver': None, 'flags': None, 'pre': None},
-                        ('libc.so.6(GLIBC_2.3.4)(64bit)', None, None, None): {
-                            'name': 'libc.so.6(GLIBC_2.3.4)(64bit)', 'epoch': None,
-                            'rel': None, 'ver': None, 'flags': None, 'pre': None},
-                        ('libc.so.6(GLIBC_2.4)(64bit)', None, None, None): {
-                            'name': 'libc.so.6(GLIBC_2.4)(64bit)', 'epoch': None,
-                            'rel': None, 'ver': None, 'flags': None, 'pre': None},
-                        ('libpcre.so.1()(64bit)', None, None, None): {
-                            'name': 'libpcre.so.1()(64bit)', 'epoch': None,
-                            'rel': None, 'ver': None, 'flags': None, 'pre': None},
-                        ('pcre', None, None, None): {
-                            'name': 'pcre', 'epoch': None,
-                            'rel': None, 'ver': None, 'flags': None, 'pre': None},
-                        ('rtld(GNU_HASH)', None, None, None): {
-                            'name': 'rtld(GNU_HASH)', 'epoch': None,
-                            'rel': None, 'ver': None, 'flags': None, 'pre': None},
-                        ('tarantool', '0', None, '1.9.0.0'): {
-                            'name': 'tarantool', 'epoch': '0',
-                            'rel': None, 'ver': '1.9.0.0', 'flags': 'GT', 'pre': None}
+                        ('libc.so.6()(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libc.so.6()(64bit)', epoch=None,
+                            rel=None, ver=None, flags=None, pre=None),
+                        ('libc.so.6(GLIBC_2.14)(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libc.so.6(GLIBC_2.14)(64bit)', epoch=None,
+                            rel=None, ver=None, flags=None, pre=None),
+                        ('libc.so.6(GLIBC_2.2.5)(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libc.so.6(GLIBC_2.2.5)(64bit)', epoch=None,
+                            rel=None, ver=None, flags=None, pre=None),
+                        ('libc.so.6(GLIBC_2.3)(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libc.so.6(GLIBC_2.3)(64bit)', epoch=None,
+                            rel=None, ver=None, flags=None, pre=None),
+                        ('libc.so.6(GLIBC_2.3.4)(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libc.so.6(GLIBC_2.3.4)(64bit)', epoch=None,
+                            rel=None, ver=None, flags=None, pre=None),
+                        ('libc.so.6(GLIBC_2.4)(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libc.so.6(GLIBC_2.4)(64bit)', epoch=None,
+                            rel=None, ver=None, flags=None, pre=None),
+                        ('libpcre.so.1()(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libpcre.so.1()(64bit)', epoch=None,
+                            rel=None, ver=None, flags=None, pre=None),
+                        ('pcre', None, None, None): rpmrepo.Dep(
+                            name='pcre', epoch=None,
+                            rel=None, ver=None, flags=None, pre=None),
+                        ('rtld(GNU_HASH)', None, None, None): rpmrepo.Dep(
+                            name='rtld(GNU_HASH)', epoch=None,
+                            rel=None, ver=None, flags=None, pre=None),
+                        ('tarantool', '0', None, '1.9.0.0'): rpmrepo.Dep(
+                            name='tarantool', epoch='0',
+                            rel=None, ver='1.9.0.0', flags='GT', pre=None)
                     },
                     'obsoletes': {},
                     'conflicts': {},
@@ -203,7 +244,8 @@ rel="1.el7.centos"/>
 </package>
 </metadata>
 """
-        self.assertEqual(rpmrepo.dump_primary(primary), primary_str)
+        self.assertEqual(canonical_xml(rpmrepo.dump_primary(primary)),
+                         canonical_xml(primary_str))
 
     def test_escape_xml_special_chars_in_primary_dump(self):
         primary = {
@@ -231,83 +273,83 @@ rel="1.el7.centos"/>
                     'header_start': '4424',
                     'header_end': '147768',
                     'provides': {
-                        ('python3-gevent', '0', '1.el7', '21.1.2'): {
-                            'name': 'python3-gevent', 'epoch': '0', 'rel': '1.el7', 'ver': '21.1.2',
-                            'flags': 'EQ'
-                        },
-                        ('python3-gevent(x86-64)', '0', '1.el7', '21.1.2'): {
-                            'name': 'python3-gevent(x86-64)', 'epoch': '0', 'rel': '1.el7',
-                            'ver': '21.1.2', 'flags': 'EQ'
-                        },
-                        ('python3.8dist(gevent)', '0', None, '21.1.2'): {
-                            'name': 'python3.8dist(gevent)', 'epoch': '0', 'rel': None,
-                            'ver': '21.1.2', 'flags': 'EQ'
-                        },
-                        ('python3dist(gevent)', '0', None, '21.1.2'): {
-                            'name': 'python3dist(gevent)', 'epoch': '0', 'rel': None,
-                            'ver': '21.1.2', 'flags': 'EQ'
-                        }
+                        ('python3-gevent', '0', '1.el7', '21.1.2'): rpmrepo.Dep(
+                            name='python3-gevent', epoch='0', rel='1.el7', ver='21.1.2',
+                            flags='EQ'
+                        ),
+                        ('python3-gevent(x86-64)', '0', '1.el7', '21.1.2'): rpmrepo.Dep(
+                            name='python3-gevent(x86-64)', epoch='0', rel='1.el7',
+                            ver='21.1.2', flags='EQ'
+                        ),
+                        ('python3.8dist(gevent)', '0', None, '21.1.2'): rpmrepo.Dep(
+                            name='python3.8dist(gevent)', epoch='0', rel=None,
+                            ver='21.1.2', flags='EQ'
+                        ),
+                        ('python3dist(gevent)', '0', None, '21.1.2'): rpmrepo.Dep(
+                            name='python3dist(gevent)', epoch='0', rel=None,
+                            ver='21.1.2', flags='EQ'
+                        )
                     },
                     'requires': {
                         # The '>' and '<' should be escaped.
                         ('(python3.8dist(greenlet) >= 0.4.17 with python3.8dist(greenlet) < 2)',
-                         None, None, None): {
-                            'name': '(python3.8dist(greenlet) >= 0.4.17 '
-                                    'with python3.8dist(greenlet) < 2)',
-                            'epoch': None, 'rel': None, 'ver': None, 'flags': None, 'pre': None
-                        },
-                        ('libc.so.6()(64bit)', None, None, None): {
-                            'name': 'libc.so.6()(64bit)', 'epoch': None, 'rel': None, 'ver': None,
-                            'flags': None, 'pre': None
-                        },
-                        ('libc.so.6(GLIBC_2.2.5)(64bit)', None, None, None): {
-                            'name': 'libc.so.6(GLIBC_2.2.5)(64bit)', 'epoch': None, 'rel': None,
-                            'ver': None, 'flags': None, 'pre': None
-                        },
-                        ('libc.so.6(GLIBC_2.4)(64bit)', None, None, None): {
-                            'name': 'libc.so.6(GLIBC_2.4)(64bit)', 'epoch': None, 'rel': None,
-                            'ver': None, 'flags': None, 'pre': None
-                        },
-                        ('libcares.so.2()(64bit)', None, None, None): {
-                            'name': 'libcares.so.2()(64bit)', 'epoch': None, 'rel': None,
-                            'ver': None, 'flags': None, 'pre': None
-                        },
-                        ('libev.so.4()(64bit)', None, None, None): {
-                            'name': 'libev.so.4()(64bit)', 'epoch': None, 'rel': None, 'ver': None,
-                            'flags': None, 'pre': None
-                        },
-                        ('libpthread.so.0()(64bit)', None, None, None): {
-                            'name': 'libpthread.so.0()(64bit)', 'epoch': None, 'rel': None,
-                            'ver': None, 'flags': None, 'pre': None
-                        },
-                        ('libpthread.so.0(GLIBC_2.2.5)(64bit)', None, None, None): {
-                            'name': 'libpthread.so.0(GLIBC_2.2.5)(64bit)', 'epoch': None,
-                            'rel': None, 'ver': None, 'flags': None, 'pre': None
-                        },
-                        ('python(abi)', '0', None, '3.8'): {
-                            'name': 'python(abi)', 'epoch': '0', 'rel': None, 'ver': '3.8',
-                            'flags': 'EQ', 'pre': None
-                        },
-                        ('python3-greenlet', '0', None, '0.4.17'): {
-                            'name': 'python3-greenlet', 'epoch': '0', 'rel': None, 'ver': '0.4.17',
-                            'flags': 'GT', 'pre': None
-                        },
-                        ('python3.8dist(setuptools)', None, None, None): {
-                            'name': 'python3.8dist(setuptools)', 'epoch': None, 'rel': None,
-                            'ver': None, 'flags': None, 'pre': None
-                        },
-                        ('python3.8dist(zope.event)', None, None, None): {
-                            'name': 'python3.8dist(zope.event)', 'epoch': None, 'rel': None,
-                            'ver': None, 'flags': None, 'pre': None
-                        },
-                        ('python3.8dist(zope.interface)', None, None, None): {
-                            'name': 'python3.8dist(zope.interface)', 'epoch': None, 'rel': None,
-                            'ver': None, 'flags': None, 'pre': None
-                        },
-                        ('rtld(GNU_HASH)', None, None, None): {
-                            'name': 'rtld(GNU_HASH)', 'epoch': None, 'rel': None, 'ver': None,
-                            'flags': None, 'pre': None
-                        }
+                         None, None, None): rpmrepo.Dep(
+                            name='(python3.8dist(greenlet) >= 0.4.17 '
+                                 'with python3.8dist(greenlet) < 2)',
+                            epoch=None, rel=None, ver=None, flags=None, pre=None
+                        ),
+                        ('libc.so.6()(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libc.so.6()(64bit)', epoch=None, rel=None, ver=None,
+                            flags=None, pre=None
+                        ),
+                        ('libc.so.6(GLIBC_2.2.5)(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libc.so.6(GLIBC_2.2.5)(64bit)', epoch=None, rel=None,
+                            ver=None, flags=None, pre=None
+                        ),
+                        ('libc.so.6(GLIBC_2.4)(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libc.so.6(GLIBC_2.4)(64bit)', epoch=None, rel=None,
+                            ver=None, flags=None, pre=None
+                        ),
+                        ('libcares.so.2()(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libcares.so.2()(64bit)', epoch=None, rel=None,
+                            ver=None, flags=None, pre=None
+                        ),
+                        ('libev.so.4()(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libev.so.4()(64bit)', epoch=None, rel=None, ver=None,
+                            flags=None, pre=None
+                        ),
+                        ('libpthread.so.0()(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libpthread.so.0()(64bit)', epoch=None, rel=None,
+                            ver=None, flags=None, pre=None
+                        ),
+                        ('libpthread.so.0(GLIBC_2.2.5)(64bit)', None, None, None): rpmrepo.Dep(
+                            name='libpthread.so.0(GLIBC_2.2.5)(64bit)', epoch=None,
+                            rel=None, ver=None, flags=None, pre=None
+                        ),
+                        ('python(abi)', '0', None, '3.8'): rpmrepo.Dep(
+                            name='python(abi)', epoch='0', rel=None, ver='3.8',
+                            flags='EQ', pre=None
+                        ),
+                        ('python3-greenlet', '0', None, '0.4.17'): rpmrepo.Dep(
+                            name='python3-greenlet', epoch='0', rel=None, ver='0.4.17',
+                            flags='GT', pre=None
+                        ),
+                        ('python3.8dist(setuptools)', None, None, None): rpmrepo.Dep(
+                            name='python3.8dist(setuptools)', epoch=None, rel=None,
+                            ver=None, flags=None, pre=None
+                        ),
+                        ('python3.8dist(zope.event)', None, None, None): rpmrepo.Dep(
+                            name='python3.8dist(zope.event)', epoch=None, rel=None,
+                            ver=None, flags=None, pre=None
+                        ),
+                        ('python3.8dist(zope.interface)', None, None, None): rpmrepo.Dep(
+                            name='python3.8dist(zope.interface)', epoch=None, rel=None,
+                            ver=None, flags=None, pre=None
+                        ),
+                        ('rtld(GNU_HASH)', None, None, None): rpmrepo.Dep(
+                            name='rtld(GNU_HASH)', epoch=None, rel=None, ver=None,
+                            flags=None, pre=None
+                        )
                     },
                     'obsoletes': {},
                     'conflicts': {},
@@ -365,3 +407,78 @@ pkgid="YES">3dbbd8920df527ebb4176d531e5ec1da43cd44d1359dd69cd102a0e75131f878</ch
 </metadata>
 """
         self.assertEqual(rpmrepo.dump_primary(primary), primary_str)
+
+        # The parsed metadata must be dumped back unchanged, vendor included.
+        parsed = rpmrepo.parse_primary(primary_str.encode('utf-8'))
+        self.assertEqual(rpmrepo.dump_primary(parsed), primary_str)
+
+    def test_header_to_primary_dependencies(self):
+        """Check the dependency sections built by header_to_primary."""
+        header = {
+            'NAME': b'foo',
+            'ARCH': b'x86_64',
+            'SOURCERPM': b'foo-1.0-1.src.rpm',
+            'VERSION': b'1.0',
+            'RELEASE': b'1',
+            'SIZE': 42,
+            'PAYLOADSIZE': 43,
+            'PROVIDENAME': [b'foo', b'/usr/bin/foo'],
+            'PROVIDEVERSION': [b'1.0-1', b''],
+            'PROVIDEFLAGS': [8, 0],
+            'REQUIRENAME': [b'rpmlib(CompressedFileNames)', b'/usr/bin/foo', b'/etc/foo.conf',
+                            b'/bin/sh', b'bar'],
+            'REQUIREVERSION': [b'3.0.4-1', b'', b'', b'', b'1:2.0'],
+            'REQUIREFLAGS': [(1 << 24) | 8, 0, 0, 4352, 12],
+            'OBSOLETENAME': [b'foo-old'],
+            'OBSOLETEVERSION': [b'0.9'],
+            'OBSOLETEFLAGS': 2,
+            'CONFLICTNAME': [],
+            'CONFLICTVERSION': [],
+            'CONFLICTFLAGS': [],
+            'DIRNAMES': [b'/usr/bin/', b'/etc/'],
+            'BASENAMES': [b'foo', b'foo.conf'],
+            'DIRINDEXES': [0, 1],
+            'FILEMODES': [0o100755, 0o100644],
+        }
+
+        _, package = rpmrepo.header_to_primary(header, 'sha256', 1655216309.0,
+                                               'Packages/foo-1.0-1.x86_64.rpm', 280, 6104, 20780)
+        fmt = package['format']
+
+        self.assertEqual(fmt['provides'], {
+            ('foo', '0', '1', '1.0'): rpmrepo.Dep(
+                name='foo', epoch='0', rel='1', ver='1.0', flags='EQ'),
+            ('/usr/bin/foo', None, None, None): rpmrepo.Dep(
+                name='/usr/bin/foo', epoch=None, rel=None, ver=None,
+                flags=None),
+        })
+        # "rpmlib(...)", provided and primary files are not listed.
+        self.assertEqual(fmt['requires'], {
+            ('/bin/sh', None, None, None): rpmrepo.Dep(
+                name='/bin/sh', epoch=None, rel=None, ver=None, flags=None,
+                pre='1'),
+            ('bar', '1', None, '2.0'): rpmrepo.Dep(
+                name='bar', epoch='1', rel=None, ver='2.0', flags='GE',
+                pre=None),
+        })
+        self.assertEqual(fmt['obsoletes'], {
+            ('foo-old', '0', None, '0.9'): rpmrepo.Dep(
+                name='foo-old', epoch='0', rel=None, ver='0.9', flags='LT'),
+        })
+        self.assertEqual(fmt['conflicts'], {})
+
+    def test_dump_metafile_checksums(self):
+        """The test checks that checksums and sizes calculated while dumping
+        a metafile match the data.
+        """
+        # Enough packages for the data to be hashed in several chunks.
+        other = other_data_many(500)
+        data_gz, data_sha256, data_gz_sha256, data_size, data_gz_size = \
+            rpmrepo.dump_metafile(rpmrepo.write_other, other)
+        data = rpmrepo.gunzip_bytes(data_gz)
+
+        self.assertEqual(data.decode('utf-8'), rpmrepo.dump_other(other))
+        self.assertEqual(data_sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual(data_size, len(data))
+        self.assertEqual(data_gz_sha256, hashlib.sha256(data_gz).hexdigest())
+        self.assertEqual(data_gz_size, len(data_gz))
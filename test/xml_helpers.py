@@ -0,0 +1,19 @@
+import xml.etree.ElementTree as ET
+
+
+def _canonical_element(elem):
+    return (elem.tag,
+            sorted(elem.attrib.items()),
+            (elem.text or '').strip(),
+            (elem.tail or '').strip(),
+            [_canonical_element(child) for child in elem])
+
+
+def canonical_xml(data):
+    """Return the xml document as nested tuples of its elements, so documents
+    that differ only in formatting compare equal.
+
+    ET.canonicalize() isn't used because it is available since Python 3.8.
+    """
+
+    return _canonical_element(ET.fromstring(data))